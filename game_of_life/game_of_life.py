@@ -1,14 +1,17 @@
 import math
+import threading
 import numpy as np
 import pathlib as pl
-from time import sleep
 import pyqtgraph as pg
 from loguru import logger
 from PyQt5 import QtCore, QtGui, uic, QtWidgets
-from PyQt5.QtCore import pyqtSignal, QObject, QThread, Qt
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject, QThread, QTimer, Qt
 from PyQt5.QtWidgets import QWidget, QDialog, QMainWindow, QFileDialog
 
 _help_path = pl.Path(__file__).parent / 'help_dialog.ui'
+_window_path = pl.Path(__file__).parent / 'main_window.ui'
+_widget_path = pl.Path(__file__).parent / 'game_of_life.ui'
+_presets_dir = pl.Path(__file__).parent / 'presets'
 _help_dialog = uic.loadUiType(_help_path)[0]
 
 pg.setConfigOption('foreground', 'k')
@@ -25,88 +28,90 @@ _grid_custom = 'Custom'
 
 def load_preset(fpath: pl.Path) -> np.ndarray:
     assert fpath.is_file()
-    return np.load(fpath)
+    return np.load(fpath).astype(np.uint8, copy=False)
 
 
 def save_preset(fpath: pl.Path, preset: np.ndarray) -> None:
     np.save(fpath, preset)
 
 
-class _RectItem(pg.GraphicsObject):
-    def __init__(self, rect, parent=None):
-        super().__init__(parent)
-        self._rect = rect
-        self.picture = QtGui.QPicture()
-        self._generate_picture()
-
-    @property
-    def rect(self):
-        return self._rect
-
-    def _generate_picture(self):
-        painter = QtGui.QPainter(self.picture)
-        painter.setPen(pg.mkPen("w"))
-        painter.setBrush(pg.mkBrush("k"))
-        painter.drawRect(self.rect)
-        painter.end()
-
-    def paint(self, painter, option, widget=None):
-        painter.drawPicture(0, 0, self.picture)
-
-    def boundingRect(self):
-        return QtCore.QRectF(self.picture.boundingRect())
+# maps cell state 0 -> white, 1 -> black
+_cell_lut = np.array([[255, 255, 255], [0, 0, 0]], dtype=np.uint8)
 
 
 class GameGridPlot:
     def __init__(self, widget: QWidget, clickedFnc) -> None:
         self._clickedFnc = clickedFnc
         self.plot_graph = pg.PlotWidget()
+        self._plot_item = self.plot_graph.getPlotItem()
+        self._view_box = self._plot_item.getViewBox()
         self.plot_graph.setAspectLocked(lock=True, ratio=1)
-        self.plot_graph.getPlotItem().hideAxis('bottom')
-        self.plot_graph.getPlotItem().hideAxis('left')
+        self._plot_item.hideAxis('bottom')
+        self._plot_item.hideAxis('left')
         self.plot_graph.setMenuEnabled(False)
         self.plot_graph.setMouseEnabled(x=False, y=False)
         self.plot_graph.hideButtons()
         widget.addWidget(self.plot_graph)
         self.size = None
-        self.grid_objects = []
-        self.grid_visible = []
+        self.image_array = None
+        self.image_item = None
+        self._grid_lines = None
+        self._batching = False
 
         self.plot_graph.scene().sigMouseClicked.connect(self._mouse_clicked)
 
     def set_size(self, size: tuple[int, int]):
         self.size = size
-        self.plot_graph.clear()
-        pen = pg.mkPen('k', width=2)
-        for i in range(-1, size[0]):
-            self.plot_graph.plot([i + 1, i + 1], [0, size[1]], pen=pen)
-        for i in range(-1, size[1]):
-            self.plot_graph.plot([0, size[0]], [i + 1, i + 1], pen=pen)
-        self.grid_visible = []
-        self.grid_objects = []
-        for i in range(self.size[0]):
-            self.grid_visible.append([])
-            self.grid_objects.append([])
-            for j in range(self.size[1]):
-                self.grid_visible[-1].append(False)
-                rect = _RectItem(QtCore.QRectF(i, j, 1, 1))
-                self.plot_graph.addItem(rect)
-                self.grid_objects[-1].append(rect)
-                rect.setVisible(False)
+        self.image_array = np.zeros(size, dtype=np.uint8)
+        if self.image_item is None:
+            self.image_item = pg.ImageItem(self.image_array, levels=(0, 1), lut=_cell_lut)
+            self.image_item.setZValue(-1)
+            self.plot_graph.addItem(self.image_item)
+        else:
+            self.image_item.setImage(self.image_array, autoLevels=False)
+        self.image_item.setRect(QtCore.QRectF(0, 0, size[0], size[1]))
+        path = QtGui.QPainterPath()
+        for i in range(size[0] + 1):
+            path.moveTo(i, 0)
+            path.lineTo(i, size[1])
+        for j in range(size[1] + 1):
+            path.moveTo(0, j)
+            path.lineTo(size[0], j)
+        if self._grid_lines is None:
+            self._grid_lines = QtWidgets.QGraphicsPathItem(path)
+            self._grid_lines.setPen(pg.mkPen('k', width=2))
+            self.plot_graph.addItem(self._grid_lines)
+        else:
+            self._grid_lines.setPath(path)
 
     def select_cell(self, pos: tuple[int, int]):
         self._validate_pos(pos)
-        if self.grid_visible[pos[0]][pos[1]]:
+        if self.image_array[pos[0], pos[1]]:
             # remove existing square
             logger.warning(f"Cell {pos} already selected")
 
-        self.grid_objects[pos[0]][pos[1]].setVisible(True)
-        self.grid_visible[pos[0]][pos[1]] = True
+        self.image_array[pos[0], pos[1]] = 1
+        if not self._batching:
+            self.image_item.updateImage()
 
     def unselect_cell(self, pos: tuple[int, int]):
         self._validate_pos(pos)
-        self.grid_objects[pos[0]][pos[1]].setVisible(False)
-        self.grid_visible[pos[0]][pos[1]] = False
+        self.image_array[pos[0], pos[1]] = 0
+        if not self._batching:
+            self.image_item.updateImage()
+
+    def set_grid(self, grid: np.ndarray):
+        """ Redraw the whole board from one array """
+        np.copyto(self.image_array, grid)
+        self.image_item.updateImage()
+
+    def begin_batch(self):
+        """ Defer image refreshes until end_batch """
+        self._batching = True
+
+    def end_batch(self):
+        self._batching = False
+        self.image_item.updateImage()
 
     def _validate_pos(self, pos: tuple[int, int]):
         if len(pos) != 2:
@@ -120,7 +125,7 @@ class GameGridPlot:
         if self.size is None:
             return
 
-        pos = self.plot_graph.getPlotItem().getViewBox().mapSceneToView(x.scenePos())
+        pos = self._view_box.mapSceneToView(x.scenePos())
         x = math.floor(pos.x())
         y = math.floor(pos.y())
 
@@ -132,13 +137,22 @@ class GameGridPlot:
         self._clickedFnc((x, y))
 
 
-class GameGrid:
+class GameGrid(QObject):
+    # emitted from the worker thread, delivered on the GUI thread
+    frame_ready = pyqtSignal()
+    sim_stopped = pyqtSignal()
+
     def __init__(self, clickedFnc, stopFnc, size: tuple[int, int] = (10, 10)) -> None:
+        super().__init__()
         self.grid: np.ndarray = None
         self.plot: GameGridPlot = None
         self.size = size
         self._clickedFnc = clickedFnc
         self._stopFnc = stopFnc
+        self._grid_lock = threading.Lock()
+
+        self.frame_ready.connect(self._render)
+        self.sim_stopped.connect(self._on_stopped)
 
         self.set_size(size)
 
@@ -148,80 +162,85 @@ class GameGrid:
 
     def set_size(self, size: tuple[int, int]):
         """ Change size of game grid """
-        self.grid = np.zeros(size)
+        self.grid = np.zeros(size, dtype=np.uint8)
+        self._next = np.empty_like(self.grid)
+        self._padded = np.zeros((size[0] + 2, size[1] + 2), dtype=np.uint8)
+        self._neighs = np.empty(size, dtype=np.uint8)
         self.size = size
         if self.plot is not None:
             self.plot.set_size(size)
 
     def cell_state(self, pos: tuple[int, int]):
-        return self.grid[pos[0]][pos[1]]
+        return self.grid[pos[0], pos[1]]
 
     def select_cell(self, pos: tuple[int, int]):
         """ Make cell black """
-        self.grid[pos[0]][pos[1]] = 1
+        self.grid[pos[0], pos[1]] = 1
         self.plot.select_cell(pos)
 
     def unselect_cell(self, pos: tuple[int, int]):
         """ Make cell white """
-        self.grid[pos[0]][pos[1]] = 0
+        self.grid[pos[0], pos[1]] = 0
         self.plot.unselect_cell(pos)
 
+    @pyqtSlot()
     def step_next(self):
-        new_alive = []
-        new_dead = []
-
-        for i in range(self.grid.shape[0]):
-            for j in range(self.grid.shape[1]):
-                n_alive = self._neighs_alive((i, j))
-                if self.grid[i][j] == 1:
-                    if n_alive not in [2, 3]:
-                        new_dead.append((i, j))
-                elif self.grid[i][j] == 0:
-                    if n_alive == 3:
-                        new_alive.append((i, j))
-                else:
-                    raise ValueError
-
-        if len(new_alive) == 0 and len(new_dead) == 0:
-            self._stopFnc()
-
-        for pos in new_dead:
-            self.plot.unselect_cell(pos)
-            self.grid[pos[0]][pos[1]] = 0
-        for pos in new_alive:
-            self.plot.select_cell(pos)
-            self.grid[pos[0]][pos[1]] = 1
-
-    def _neighs_alive(self, pos: tuple[int, int]) -> int:
-        x, y = pos
-        n_alive = 0
-        if x > 0:
-            n_alive += self.grid[x - 1][y]
-        if x < self.grid.shape[0] - 1:
-            n_alive += self.grid[x + 1][y]
-        if y > 0:
-            n_alive += self.grid[x][y - 1]
-        if y < self.grid.shape[1] - 1:
-            n_alive += self.grid[x][y + 1]
-
-        if y > 0 and x > 0:
-            n_alive += self.grid[x - 1][y - 1]
-        if x < self.grid.shape[0] - 1 and y < self.grid.shape[1] - 1:
-            n_alive += self.grid[x + 1][y + 1]
-
-        if y > 0 and x < self.grid.shape[0] - 1:
-            n_alive += self.grid[x + 1][y - 1]
-        if x > 0 and y < self.grid.shape[1] - 1:
-            n_alive += self.grid[x - 1][y + 1]
-
-        return n_alive
+        """ Advance one generation; safe to call from the worker thread """
+        alive = np.argwhere(self.grid)
+        if len(alive) == 0:
+            self.sim_stopped.emit()
+            return
+
+        # only the live cells' bounding box plus a one-cell halo can change
+        x0, y0 = np.maximum(alive.min(axis=0) - 1, 0)
+        x1, y1 = np.minimum(alive.max(axis=0) + 2, self.grid.shape)
+        region = self.grid[x0:x1, y0:y1]
+        neighs = self._neighbor_counts(region)
+
+        np.copyto(self._next, self.grid)
+        np.copyto(self._next[x0:x1, y0:y1], ((region == 1) & ((neighs == 2) | (neighs == 3)))
+                  | ((region == 0) & (neighs == 3)))
+
+        if np.array_equal(self._next, self.grid):
+            self.sim_stopped.emit()
+
+        with self._grid_lock:
+            self.grid, self._next = self._next, self.grid
+        self.frame_ready.emit()
+
+    @pyqtSlot()
+    def _render(self):
+        with self._grid_lock:
+            self.plot.set_grid(self.grid)
+
+    @pyqtSlot()
+    def _on_stopped(self):
+        self._stopFnc()
+
+    def _neighbor_counts(self, grid: np.ndarray) -> np.ndarray:
+        """ Number of alive neighbours of every cell at once """
+        padded = self._padded[:grid.shape[0] + 2, :grid.shape[1] + 2]
+        # the view border may hold stale cells from a larger previous region
+        padded[0, :] = 0
+        padded[-1, :] = 0
+        padded[:, 0] = 0
+        padded[:, -1] = 0
+        padded[1:-1, 1:-1] = grid
+        neighs = self._neighs[:grid.shape[0], :grid.shape[1]]
+        np.add(padded[:-2, :-2], padded[:-2, 1:-1], out=neighs)
+        for shifted in (padded[:-2, 2:], padded[1:-1, :-2], padded[1:-1, 2:],
+                        padded[2:, :-2], padded[2:, 1:-1], padded[2:, 2:]):
+            np.add(neighs, shifted, out=neighs)
+        return neighs
+
+    def load_grid(self, grid: np.ndarray):
+        """ Replace whole board content at once """
+        np.copyto(self.grid, grid)
+        self.plot.set_grid(self.grid)
 
     def reset(self):
-        for i in range(self.grid.shape[0]):
-            for j in range(self.grid.shape[1]):
-                pos = (i, j)
-                self.plot.unselect_cell(pos)
-        self.grid = np.zeros(self.size)
+        self.grid.fill(0)
+        self.plot.set_grid(self.grid)
 
 
 class _Worker(QObject):
@@ -231,13 +250,24 @@ class _Worker(QObject):
         super().__init__()
         self.running = False
         self.turn_time = 1
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        # signal-to-signal: keeps the emission on this worker's thread
+        self._timer.timeout.connect(self.tick)
+
+    @pyqtSlot()
+    def start(self):
+        self._timer.start(int(1000 / self.turn_time))
+
+    @pyqtSlot()
+    def stop(self):
+        self._timer.stop()
 
-    def run(self):
-        """Long-running task."""
-        while True:
-            sleep(1 / self.turn_time)
-            if self.running:
-                self.tick.emit()
+    @pyqtSlot(float)
+    def set_speed(self, turn_time: float):
+        self.turn_time = turn_time
+        if self._timer.isActive():
+            self._timer.setInterval(int(1000 / turn_time))
 
 
 class _HelpDialog(QDialog, _help_dialog):
@@ -273,9 +303,10 @@ class MainModule:
         # Step 4: Move worker to the thread
         self.worker.moveToThread(self.thread)
         # Step 5: Connect signals and slots
-        self.thread.started.connect(self.worker.run)
-        self.worker.tick.connect(self.game_grid.step_next)
-        # Step 6: Start the thread
+        # direct connection keeps the computation on the worker thread;
+        # GameGrid marshals rendering back to the GUI thread itself
+        self.worker.tick.connect(self.game_grid.step_next, Qt.DirectConnection)
+        # Step 6: Start the thread (its event loop drives the worker timer)
         self.thread.start()
 
     def _connect(self, connect: bool = True):
@@ -350,29 +381,25 @@ class MainModule:
 
     def _start_stop_clicked(self, stop=False, start=False):
         if stop:
-            self.worker.running = False
-            text = 'Start'
+            running = False
         elif start:
-            self.worker.running = True
-            text = 'Stop'
+            running = True
         else:
-            self.worker.running = not self.worker.running
-            if self.worker.running:
-                text = 'Stop'
-            else:
-                text = 'Start'
-        self.widget.pushButton_start_stop.setText(text)
+            running = not self.worker.running
+        self.worker.running = running
+        # start/stop the timer on the worker thread
+        QtCore.QMetaObject.invokeMethod(self.worker, 'start' if running else 'stop', Qt.QueuedConnection)
+        self.widget.pushButton_start_stop.setText('Stop' if running else 'Start')
 
     def _speed_changed(self, val: float):
-        self.worker.turn_time = val
+        QtCore.QMetaObject.invokeMethod(self.worker, 'set_speed', Qt.QueuedConnection, QtCore.Q_ARG(float, val))
 
     def _show_help(self):
         help_dialog = _HelpDialog(parent=self.widget)
         help_dialog.exec_()
 
     def _load_preset(self):
-        def_folder = pl.Path(__file__).parent / 'presets'
-        fpath = QtWidgets.QFileDialog.getOpenFileName(self.widget, "Save Preset", str(def_folder), "Preset files (*.npy)")[0]
+        fpath = QtWidgets.QFileDialog.getOpenFileName(self.widget, "Save Preset", str(_presets_dir), "Preset files (*.npy)")[0]
         if fpath in [None, '']:
             return
         fpath = pl.Path(fpath)
@@ -388,14 +415,10 @@ class MainModule:
         self._connect_spins(True)
         self._spins_changed(3)
 
-        for i in range(preset.shape[0]):
-            for j in range(preset.shape[1]):
-                if preset[i][j] == 1:
-                    self.game_grid.select_cell((i, j))
+        self.game_grid.load_grid(preset)
 
     def _save_preset(self):
-        def_folder = pl.Path(__file__).parent / 'presets'
-        fpath = QFileDialog.getSaveFileName(self.widget, "Save Preset", str(def_folder), "Preset files (*.npy)")[0]
+        fpath = QFileDialog.getSaveFileName(self.widget, "Save Preset", str(_presets_dir), "Preset files (*.npy)")[0]
         if fpath in [None, '']:
             return
         if not fpath.endswith('.npy'):
@@ -410,11 +433,9 @@ class MainModule:
 class Main(QMainWindow):
     def __init__(self):
         super(Main, self).__init__()
-        window_path = pl.Path(__file__).parent / 'main_window.ui'
-        uic.loadUi(window_path, self)
+        uic.loadUi(_window_path, self)
         widget = QWidget()
-        widget_path = pl.Path(__file__).parent / 'game_of_life.ui'
-        uic.loadUi(widget_path, widget)
+        uic.loadUi(_widget_path, widget)
         module = MainModule(widget=widget)
         self.stackedWidget.addWidget(widget)
         self.show()